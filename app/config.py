@@ -0,0 +1,8 @@
+import functools
+from dotenv import load_dotenv
+
+
+@functools.cache
+def load_env() -> None:
+    # read .env on first use instead of on every import
+    load_dotenv()
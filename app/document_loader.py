@@ -1,7 +1,12 @@
-from pypdf import PdfReader
-from typing import Literal
+from typing import Iterator, Literal, TextIO
 from pathlib import Path
+import hashlib
+import json
+import locale
+import mmap
+import os
 import docx
+import pymupdf
 
 
 DocType = Literal["documentation", "rfc", "research", "manual"]
@@ -21,8 +26,16 @@ class DocumentLoader:
         "manual": "manual"
     }
 
-    def __init__(self, file_path: str) -> None:
+    CACHE_DIR = Path.home() / ".documind" / "loader_cache"
+    # only formats with a parse worth skipping, plain text is cheaper to re-read than to copy
+    CACHED_EXTENSIONS = frozenset({".pdf", ".docx"})
+    # bump when a loader's output changes, so entries cached by the old code are re-parsed
+    CACHE_VERSION = 1
+    MMAP_THRESHOLD = 1024 * 1024
+
+    def __init__(self, file_path: str, use_cache: bool = True) -> None:
         self.file_path = Path(file_path)
+        self.use_cache = use_cache
         self.doc_type = self._extract_doc_type()
         self.source =self._extract_source()
 
@@ -57,17 +70,14 @@ class DocumentLoader:
         return self.file_path.stem.lower()
     def load_pdf(self) -> str:
         try:
-            reader = PdfReader(str(self.file_path))
-            text = []
-            for page in reader.pages:
-                text.append(page.extract_text())
+            with pymupdf.open(str(self.file_path)) as doc:
+                text = [page.get_text() for page in doc]
             return '\n'.join(text)
         except Exception as e:
             raise ValueError(f"Error reading PDF: {e}")
     
     def load_txt(self, encoding="utf-8") -> str:
-        with open(str(self.file_path), "r", encoding=encoding) as f:
-            return f.read()
+        return self._read_text(encoding)
     
     def load_docx(self) -> str:
         try:
@@ -86,8 +96,24 @@ class DocumentLoader:
             raise ValueError(f"Error reading DOCX: {e}")
 
     def load_md(self) -> str:
-        with open(self.file_path, "r") as f:
-            return f.read()
+        return self._read_text()
+
+    def _read_text(self, encoding: str | None = None) -> str:
+        if self.file_path.stat().st_size <= self.MMAP_THRESHOLD:
+            with open(str(self.file_path), "r", encoding=encoding) as f:
+                return f.read()
+
+        # decode straight out of the mapping, skipping the bytes buffer f.read() would allocate
+        encoding = encoding or locale.getpreferredencoding(False)
+        with open(str(self.file_path), "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                with memoryview(mm) as view:
+                    text = str(view, encoding)
+
+        # same newline handling as text mode
+        if "\r" in text:
+            text = text.replace("\r\n", "\n").replace("\r", "\n")
+        return text
     
     def load(self) -> str:
         
@@ -107,7 +133,170 @@ class DocumentLoader:
         if not loader:
             raise ValueError(f"Unsupported file format: {self.file_path}")
         
-        return loader()
+        if not self._cache_enabled():
+            return loader()
+
+        cached = self._read_cache()
+        if cached is not None:
+            return cached
+
+        # stat before parsing, so a file that changes mid-read gets re-parsed next time
+        signature = self._file_signature()
+        text = loader()
+        self._write_cache(text, signature)
+        return text
+    
+    def iter_pages(self) -> Iterator[str]:
+        """
+        Yield the document text page by page. Only PDFs have real pages, other
+        formats are yielded as a single page
+        """
+        if self.file_path.suffix.lower() != ".pdf":
+            yield self.load()
+            return
+
+        if not self._cache_enabled():
+            yield from self._iter_pdf_pages()
+            return
+
+        cached = self._open_cache()
+        if cached is not None:
+            # the cache holds the pages joined with newlines, which cleans to the same
+            # text as the pages themselves, so it's streamed back a line at a time
+            with cached:
+                yield from self._iter_cached_lines(cached)
+            return
+
+        signature = self._file_signature()
+        cache_file = self._open_cache_file()
+
+        # pages are written to the cache as they stream past, so it never needs the full text
+        try:
+            for idx, page in enumerate(self._iter_pdf_pages()):
+                if cache_file is not None:
+                    try:
+                        if idx:
+                            cache_file.write("\n")
+                        cache_file.write(page)
+                    except (OSError, ValueError):
+                        self._discard_cache_file(cache_file)
+                        cache_file = None
+                yield page
+
+            if cache_file is not None:
+                self._commit_cache_file(cache_file, signature)
+        finally:
+            if cache_file is not None:
+                self._discard_cache_file(cache_file)
+    
+    def _iter_pdf_pages(self) -> Iterator[str]:
+        try:
+            with pymupdf.open(str(self.file_path)) as doc:
+                for page in doc:
+                    yield page.get_text()
+        except Exception as e:
+            raise ValueError(f"Error reading PDF: {e}")
+    
+    def _cache_paths(self) -> tuple[Path, Path]:
+        key = hashlib.sha1(str(self.file_path.resolve()).encode()).hexdigest()
+        return self.CACHE_DIR / f"{key}.txt", self.CACHE_DIR / f"{key}.json"
+    
+    def _file_signature(self) -> dict:
+        """
+        What a cache entry was built from, the file itself plus the code that parsed it
+        """
+        stat = self.file_path.stat()
+        parser = docx if self.file_path.suffix.lower() == ".docx" else pymupdf
+        return {
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "cache_version": self.CACHE_VERSION,
+            "parser_version": getattr(parser, "__version__", None)
+        }
+    
+    def _open_cache(self) -> TextIO | None:
+        """
+        Open the cached text if the entry still matches the file's signature
+        """
+        text_path, meta_path = self._cache_paths()
+        try:
+            if json.loads(meta_path.read_text(encoding="utf-8")) != self._file_signature():
+                return None
+            # only \n ends a line, a \r from the parser has to come back untouched
+            return open(text_path, "r", encoding="utf-8", newline="\n")
+        except (OSError, ValueError):
+            return None
+    
+    def _read_cache(self) -> str | None:
+        """
+        Return the cached text if the file hasn't changed since it was cached
+        """
+        cached = self._open_cache()
+        if cached is None:
+            return None
+        try:
+            with cached:
+                return cached.read()
+        except (OSError, ValueError):
+            return None
+    
+    @staticmethod
+    def _iter_cached_lines(cached: TextIO) -> Iterator[str]:
+        """
+        Yield the cached text as lines without their newline, which join back with
+        newlines into exactly the cached text
+        """
+        ended = True
+        for line in cached:
+            ended = line.endswith("\n")
+            yield line[:-1] if ended else line
+        # text ending in a newline (or empty) still has an empty last line
+        if ended:
+            yield ""
+    
+    def _write_cache(self, text: str, signature: dict) -> None:
+        cache_file = self._open_cache_file()
+        if cache_file is None:
+            return
+        try:
+            cache_file.write(text)
+            self._commit_cache_file(cache_file, signature)
+        except (OSError, ValueError):
+            pass
+        finally:
+            self._discard_cache_file(cache_file)
+    
+    def _cache_enabled(self) -> bool:
+        return self.use_cache and self.file_path.suffix.lower() in self.CACHED_EXTENSIONS
+    
+    def _open_cache_file(self) -> TextIO | None:
+        """
+        Open a temp file next to the cache entry, None if the cache dir isn't writable.
+        The cache is best effort, failing to write it must never fail the load
+        """
+        text_path, _ = self._cache_paths()
+        try:
+            self.CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            return open(text_path.with_suffix(f".{os.getpid()}.tmp"), "w", encoding="utf-8", newline="")
+        except OSError:
+            return None
+    
+    def _commit_cache_file(self, cache_file: TextIO, signature: dict) -> None:
+        """
+        Move a fully written temp file into place, then record the file signature
+        it was built from, so a reader never sees a half written entry as valid
+        """
+        text_path, meta_path = self._cache_paths()
+        try:
+            cache_file.close()
+            os.replace(cache_file.name, text_path)
+            meta_path.write_text(json.dumps(signature), encoding="utf-8")
+        except OSError:
+            pass
+    
+    def _discard_cache_file(self, cache_file: TextIO) -> None:
+        cache_file.close()
+        Path(cache_file.name).unlink(missing_ok=True)
     
     def get_metadata(self) -> dict:
         return {
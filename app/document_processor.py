@@ -1,12 +1,154 @@
 import re
-import string
 import unicodedata
-from typing import Literal
+from typing import Iterable, Iterator, Literal
 
 from app.utils import count_words, count_characters
 
 DocType = Literal["documentation", "rfc", "research", "manual"]
 
+_WS_RE = re.compile(r"[ \t]+")
+_NL_RE = re.compile(r"\n{3,}")
+_BULLET_RE = re.compile(r'^[\-\*\+•]\s+')
+_NUMBERED_RE = re.compile(r'^\d+[\.\)]\s+')
+_BULLET_FIRSTS = frozenset('-*+•')
+
+_REPLACEMENTS = {
+    '\u2018': "'",  # Left single quote
+    '\u2019': "'",  # Right single quote
+    '\u201c': '"',  # Left double quote
+    '\u201d': '"',  # Right double quote
+    '\u2013': '-',  # En dash
+    '\u2014': '-',  # Em dash
+    '\u2026': '...',  # Ellipsis
+}
+
+
+class _SpecialCharTable(dict):
+    """
+    str.translate table that drops control, format, surrogate, private use and
+    unassigned characters. ASCII is filled in up front, anything else is classified
+    the first time it shows up and cached
+    """
+    REJECTED_CATEGORIES = ('Cc', 'Cf', 'Cs', 'Co', 'Cn')
+    ALWAYS_KEEP = '\n\t'
+
+    def __init__(self) -> None:
+        super().__init__()
+        for codepoint in range(128):
+            self[codepoint]
+
+    def __missing__(self, codepoint: int) -> int | None:
+        char = chr(codepoint)
+        if char in self.ALWAYS_KEEP or unicodedata.category(char) not in self.REJECTED_CATEGORIES:
+            value = codepoint
+        else:
+            value = None
+        self[codepoint] = value
+        return value
+
+
+_SPECIAL_CHAR_TABLE = _SpecialCharTable()
+
+
+def clean_whitespace_str(text: str) -> str:
+    """
+    Normalize whitespaces in a page, and retain the document structure
+    """
+    text = text.replace("\r\n", "\n").replace("\r", "\n")
+
+    lines = [line.strip() for line in text.split("\n")]
+
+    text = "\n".join(lines)
+
+    text = _WS_RE.sub(" ", text)
+
+    return _NL_RE.sub("\n\n", text)
+
+
+def remove_special_characters_str(text: str) -> str:
+    text = unicodedata.normalize("NFKC", text)
+    
+    for old, new in _REPLACEMENTS.items():
+        text = text.replace(old, new)
+    
+    return text.translate(_SPECIAL_CHAR_TABLE)
+
+
+def preserve_structure_str(text: str) -> str:
+    lines = text.split("\n")
+    processed_lines = []
+    for line in lines:
+        stripped = line.strip()
+
+        if not stripped:
+            processed_lines.append('')
+            continue
+        
+        first = stripped[0]
+
+        if first == "#":
+            processed_lines.append(f'[HEADER] {stripped}')
+        elif stripped.isupper() and len(stripped.split()) >= 3:
+            processed_lines.append(f'[HEADER] {stripped}')
+        elif '|' in stripped or '\t' in line:
+            if stripped.count('|') >= 2 or line.count('\t') >= 2:
+                processed_lines.append(f'[TABLE] {stripped}')
+            else:
+                processed_lines.append(stripped)
+        # most lines are prose, only run the regexes when the first char can match
+        elif first in _BULLET_FIRSTS and _BULLET_RE.match(stripped):
+            processed_lines.append(f'[BULLET] {stripped}')
+        elif first.isdigit() and _NUMBERED_RE.match(stripped):
+            processed_lines.append(f'[NUMBERED] {stripped}')
+        else:
+            processed_lines.append(stripped)
+    
+    return '\n'.join(processed_lines)
+
+
+def _clean_pages(pages: Iterable[str]) -> Iterator[str]:
+    r"""
+    Clean pages one at a time, yielding pieces that join into exactly what the
+    whole document chain gives for the pages joined with newlines. Every stage
+    works line by line except the blank line collapse in clean_whitespace, so the
+    only state carried between pages is the newline run at the seam
+
+    Blank lines left by dropped characters survive, since the collapse runs first,
+    and a page ending in \r meets the join's \n as a single line break:
+
+    >>> "".join(_clean_pages(["a\n\u200b\n\nb"]))
+    'a\n\n\nb'
+    >>> "".join(_clean_pages(["a\r", "b"]))
+    'a\nb'
+
+    Any change here or to the stages has to keep matching the chain:
+
+    >>> def chain(pages):
+    ...     processor = DocumentProcessor("\n".join(pages), "documentation", "")
+    ...     return processor.clean_whitespace().remove_special_characters().preserve_structure().text
+    >>> cases = [["a\n\u200b\n\nb"], ["a\r", "b"], ["a\n\u200b", "\n\nb"], ["x\r", "", "\n\ny", "Z\r"]]
+    >>> all("".join(_clean_pages(pages)) == chain(pages) for pages in cases)
+    True
+    """
+    held = 0  # newlines ending the text so far, not yet emitted
+    seam = 0  # newlines the join adds before the next page
+    for page in pages:
+        text = clean_whitespace_str(page)
+        body = text.strip("\n")
+        if not body:
+            held += seam + len(text)
+        else:
+            # the run spanning the seam is collapsed at the whitespace stage, before
+            # dropped characters can leave any new blank lines behind
+            run = held + seam + len(text) - len(text.lstrip("\n"))
+            yield "\n" * min(run, 2)
+            yield preserve_structure_str(remove_special_characters_str(body))
+            held = len(text) - len(text.rstrip("\n"))
+        # a page ending in \r meets the join's \n as a single \r\n line break
+        seam = 0 if page.endswith("\r") else 1
+    yield "\n" * min(held, 2)
+
+
 class DocumentProcessor:
     def __init__(
         self, 
@@ -18,6 +160,21 @@ class DocumentProcessor:
         self.doc_type = doc_type
         self.source = source
     
+    @classmethod
+    def from_pages(
+        cls,
+        pages: Iterable[str],
+        doc_type: DocType,
+        source: str
+    ) -> "DocumentProcessor":
+        """
+        Build a processor by running every cleaning stage page by page, so the raw
+        document never has to be held in memory in full. The text matches running
+        clean_whitespace, remove_special_characters and preserve_structure over the
+        pages joined with newlines
+        """
+        return cls("".join(_clean_pages(pages)), doc_type=doc_type, source=source)
+    
     def clean_whitespace(self) -> str:
         """
         Normalize whitespaces in a page, and retain the document structure
@@ -25,17 +182,7 @@ class DocumentProcessor:
         if not self.text:
             return ""
 
-        text = self.text.replace("\r\n", "\n").replace("\r", "\n")
-
-        lines = [line.strip() for line in text.split("\n")]
-
-        text = "\n".join(lines)
-
-        text = re.sub(r"[ \t]+", " ", text)
-
-        text = re.sub(r"\n{3,}", "\n\n", text)
-        
-        self.text = text
+        self.text = clean_whitespace_str(self.text)
 
         return self
     
@@ -44,34 +191,9 @@ class DocumentProcessor:
         if not self.text:
             return ""
 
-        text = unicodedata.normalize("NFKC", self.text)
-        
-        replacements = {
-            '\u2018': "'",  # Left single quote
-            '\u2019': "'",  # Right single quote
-            '\u201c': '"',  # Left double quote
-            '\u201d': '"',  # Right double quote
-            '\u2013': '-',  # En dash
-            '\u2014': '-',  # Em dash
-            '\u2026': '...',  # Ellipsis
-        }
-
-        for old, new in replacements.items():
-            text = text.replace(old, new)
-        
-        allowed_chars = set(string.ascii_letters + string.digits)
-        allowed_chars.update('\n\t ')
-        if keep_punctuation:
-            allowed_chars.update(string.punctuation)
-        
-        cleaned_text = []
-        for char in text:
-            if char in allowed_chars:
-                cleaned_text.append(char)
-            elif unicodedata.category(char) not in ('Cc', 'Cf', 'Cs', 'Co', 'Cn'):
-                cleaned_text.append(char)
-        
-        self.text = "".join(cleaned_text)
+        # punctuation is never in a rejected category, so keep_punctuation doesn't change
+        # what gets dropped and both variants share one table
+        self.text = remove_special_characters_str(self.text)
         return self
 
     def extract_metadata(self, doc_id: str, doc_name: str = None, doc_path: str = None) -> dict:
@@ -105,30 +227,5 @@ class DocumentProcessor:
         if not self.text:
             return ""
         
-        lines = self.text.split("\n")
-        processed_lines = []
-        for line in lines:
-            stripped = line.strip()
-
-            if not stripped:
-                processed_lines.append('')
-                continue
-            
-            if stripped.startswith("#"):
-                processed_lines.append(f'[HEADER] {stripped}')
-            elif stripped.isupper() and len(stripped.split()) >= 3:
-                processed_lines.append(f'[HEADER] {stripped}')
-            elif '|' in stripped or '\t' in line:
-                if stripped.count('|') >= 2 or line.count('\t') >= 2:
-                    processed_lines.append(f'[TABLE] {stripped}')
-                else:
-                    processed_lines.append(stripped)
-            elif re.match(r'^[\-\*\+•]\s+', stripped):
-                processed_lines.append(f'[BULLET] {stripped}')
-            elif re.match(r'^\d+[\.\)]\s+', stripped):
-                processed_lines.append(f'[NUMBERED] {stripped}')
-            else:
-                processed_lines.append(stripped)
-        
-        self.text = '\n'.join(processed_lines)
+        self.text = preserve_structure_str(self.text)
         return self
\ No newline at end of file
@@ -1,24 +1,38 @@
+import asyncio
+import hashlib
 import os
+import sqlite3
+import threading
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 from typing import Any
-from openai import OpenAI
-from dotenv import load_dotenv
-
-load_dotenv()
+from openai import AsyncOpenAI, OpenAI
+from app.config import load_env
 
 
 class EmbeddingGenerator:
     
+    # next to the document loader's cache, so it doesn't depend on the working directory
+    CACHE_PATH = Path.home() / ".documind" / "embed_cache.sqlite3"
+    
     def __init__(
         self,
-        model: str = "text-embedding-3-small"
+        model: str = "text-embedding-3-small",
+        max_concurrency: int = 8,
+        cache_path: str | Path | None = CACHE_PATH
     ):
         """
         Initialize the embedding generator
         
         Args:
             model: OpenAI embedding model name
+            max_concurrency: Max number of batch requests in flight at once
+            cache_path: SQLite file for cached chunk embeddings (None disables the cache)
         """
         self.model = model
+        self.max_concurrency = max_concurrency
+        load_env()
         self.api_key = os.getenv("OPENAI_KEY")
         
         if not self.api_key:
@@ -33,6 +47,17 @@ class EmbeddingGenerator:
         }
         
         self.embedding_dim = self.model_dimensions.get(model, 1536)
+        
+        self.cache = None
+        if cache_path:
+            Path(cache_path).parent.mkdir(parents=True, exist_ok=True)
+            # the generator can be shared between threads, the lock serializes use of
+            # the one connection
+            self.cache = sqlite3.connect(cache_path, check_same_thread=False)
+            self._cache_lock = threading.Lock()
+            self.cache.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (key BLOB PRIMARY KEY, embedding BLOB NOT NULL)"
+            )
     
     def generate_embedding(self, text: str) -> list[float]:
         """
@@ -65,6 +90,34 @@ class EmbeddingGenerator:
         """
         Generate embeddings for multiple texts in batches
         
+        Args:
+            texts: List of input texts
+            batch_size: Number of texts to process per API call
+            
+        Returns:
+            List of embedding vectors
+        """
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(self.agenerate_embeddings_batch(texts, batch_size))
+        
+        # asyncio.run() refuses to start inside a running loop (async apps, notebooks),
+        # so run on a fresh loop in a worker thread. Async callers should await
+        # agenerate_embeddings_batch instead of blocking their loop here
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            return executor.submit(
+                asyncio.run, self.agenerate_embeddings_batch(texts, batch_size)
+            ).result()
+    
+    async def agenerate_embeddings_batch(
+        self,
+        texts: list[str],
+        batch_size: int = 100
+    ) -> list[list[float]]:
+        """
+        Async version of generate_embeddings_batch, for callers already running an event loop
+        
         Args:
             texts: List of input texts
             batch_size: Number of texts to process per API call
@@ -75,25 +128,45 @@ class EmbeddingGenerator:
         if not texts:
             return []
         
-        all_embeddings = []
+        batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
         
-        for i in range(0, len(texts), batch_size):
-            batch = texts[i:i + batch_size]
-            
-            try:
-                response = self.client.embeddings.create(
-                    model=self.model,
-                    input=batch
-                )
-                
-                batch_embeddings = [item.embedding for item in response.data]
-                all_embeddings.extend(batch_embeddings)
-                
-            except Exception as e:
-                raise RuntimeError(f"Failed to generate batch embeddings: {str(e)}")
+        try:
+            batch_results = await self._embed_batches(batches)
+        except Exception as e:
+            raise RuntimeError(f"Failed to generate batch embeddings: {str(e)}")
+        
+        all_embeddings = []
+        for batch_embeddings in batch_results:
+            all_embeddings.extend(batch_embeddings)
         
         return all_embeddings
     
+    async def _embed_batches(self, batches: list[list[str]]) -> list[list[list[float]]]:
+        """
+        Send all batches concurrently, at most max_concurrency at a time.
+        The async client is created per run since it's bound to the event loop
+        it runs on
+        """
+        sem = asyncio.Semaphore(self.max_concurrency)
+        
+        async with AsyncOpenAI(api_key=self.api_key) as aclient:
+            return await asyncio.gather(
+                *(self._embed_batch(aclient, sem, batch) for batch in batches)
+            )
+    
+    async def _embed_batch(
+        self,
+        aclient: AsyncOpenAI,
+        sem: asyncio.Semaphore,
+        batch: list[str]
+    ) -> list[list[float]]:
+        async with sem:
+            response = await aclient.embeddings.create(
+                model=self.model,
+                input=batch
+            )
+        return [item.embedding for item in response.data]
+    
     def embed_chunks(self, chunks: list[dict[str, Any]]) -> list[dict[str, Any]]:
         """
         Generate embeddings for document chunks
@@ -109,13 +182,69 @@ class EmbeddingGenerator:
         
         texts = [chunk.get("content", "") for chunk in chunks]
         
-        embeddings = self.generate_embeddings_batch(texts)
+        if self.cache is None:
+            embeddings = self.generate_embeddings_batch(texts)
+        else:
+            embeddings = self._generate_embeddings_cached(texts)
         
         for chunk, embedding in zip(chunks, embeddings):
             chunk["embedding"] = embedding
         
         return chunks
     
+    def _generate_embeddings_cached(self, texts: list[str]) -> list[list[float]]:
+        """
+        Embed texts, only sending the ones missing from the on-disk cache to the API
+        
+        Args:
+            texts: List of input texts
+            
+        Returns:
+            List of embedding vectors in the same order as texts
+        """
+        keys = [self._cache_key(text) for text in texts]
+        embeddings = self._cache_get(keys)
+        
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in embeddings:
+                missing.setdefault(key, text)
+        
+        if missing:
+            fresh = dict(zip(missing, self.generate_embeddings_batch(list(missing.values()))))
+            self._cache_put(fresh)
+            embeddings.update(fresh)
+        
+        return [embeddings[key] for key in keys]
+    
+    def _cache_key(self, text: str) -> bytes:
+        # full sha256 digest, the chunk id's 8 hex char hash is too short to key on safely
+        return hashlib.sha256(f"{self.model}\0{text}".encode()).digest()
+    
+    def _cache_get(self, keys: list[bytes], lookup_size: int = 500) -> dict[bytes, list[float]]:
+        unique_keys = list(dict.fromkeys(keys))
+        found = {}
+        
+        for i in range(0, len(unique_keys), lookup_size):
+            batch = unique_keys[i:i + lookup_size]
+            placeholders = ",".join("?" * len(batch))
+            with self._cache_lock:
+                rows = self.cache.execute(
+                    f"SELECT key, embedding FROM embeddings WHERE key IN ({placeholders})",
+                    batch
+                ).fetchall()
+            for key, blob in rows:
+                found[key] = array("d", blob).tolist()
+        
+        return found
+    
+    def _cache_put(self, embeddings: dict[bytes, list[float]]) -> None:
+        with self._cache_lock, self.cache:
+            self.cache.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, embedding) VALUES (?, ?)",
+                ((key, array("d", embedding).tobytes()) for key, embedding in embeddings.items())
+            )
+    
     def get_embedding_dimension(self) -> int:
         """Get the dimension of embeddings for the current model"""
         return self.embedding_dim
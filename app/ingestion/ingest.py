@@ -0,0 +1,46 @@
+import hashlib
+from app.document_loader import DocumentLoader
+from app.document_processor import DocumentProcessor
+
+"""
+Load + process only. Kept out of pipeline.py so ingest worker processes import
+the parsers and nothing else, pipeline.py pulls in the OpenAI and Milvus clients
+"""
+
+class IngestionPipeline:
+
+    def ingest_document(self, file_path: str) -> dict:
+
+        loader = DocumentLoader(file_path)
+        loader_metadata = loader.get_metadata()
+
+        # pages are cleaned as they're read, so the raw text is never held in full
+        processor = DocumentProcessor.from_pages(
+            loader.iter_pages(),
+            doc_type=loader_metadata["doc_type"],
+            source=loader_metadata["source"]
+        )
+        cleaned_text = processor.text
+
+        doc_id = hashlib.sha256(file_path.encode()).hexdigest()[:32]
+        doc_name = loader_metadata["file_name"]
+        metadata = processor.extract_metadata(
+            doc_id=doc_id,
+            doc_name=doc_name,
+            doc_path=loader_metadata["file_path"]
+        )
+
+        return {
+            "doc_id": doc_id,
+            "text": cleaned_text,
+            "metadata": metadata,
+            "file_path": file_path
+        }
+
+
+def ingest_file(file_path: str) -> dict:
+    """
+    Load + process a single document. Module level so it can be pickled and run
+    in a worker process
+    """
+    return IngestionPipeline().ingest_document(file_path)
@@ -1,43 +1,14 @@
-import hashlib
-from app.document_loader import DocumentLoader
-from app.document_processor import DocumentProcessor
+from app.ingestion.ingest import IngestionPipeline, ingest_file
 from app.embeddings import EmbeddingGenerator
 from app.vector_store import MilvusVectorStore
 from app.text_chunker import DocumentChunker
 
+import itertools
 import os
 import uuid
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
 
-class IngestionPipeline:
-
-    def ingest_document(self, file_path: str) -> dict:
-        
-        loader = DocumentLoader(file_path)
-        raw_text = loader.load()
-        loader_metadata = loader.get_metadata()
-        
-        processor = DocumentProcessor(
-            raw_text,
-            doc_type=loader_metadata["doc_type"],
-            source=loader_metadata["source"]
-        )
-        processor.clean_whitespace().remove_special_characters().preserve_structure()
-        cleaned_text = processor.text
-        
-        doc_id = hashlib.sha256(file_path.encode()).hexdigest()[:32]
-        doc_name = loader_metadata["file_name"]
-        metadata = processor.extract_metadata(
-            doc_id=doc_id, 
-            doc_name=doc_name, 
-            doc_path=loader_metadata["file_path"]
-        )
-
-        return {
-            "doc_id": doc_id,
-            "text": cleaned_text,
-            "metadata": metadata,
-            "file_path": file_path
-        }
 
 class IndexingPipeline:
     """Handles chunking, embedding generation, and vector storage"""
@@ -75,6 +46,10 @@ class IndexingPipeline:
             host=milvus_host,
             embedding_dim=self.embedder.get_embedding_dimension()
         )
+        
+        # one pool for the pipeline's lifetime, so workers start once and are reused
+        # across files and index_directory calls
+        self._ingest_pool = ProcessPoolExecutor(max_workers=os.cpu_count())
     
     def index_document(
         self,
@@ -145,8 +120,7 @@ class IndexingPipeline:
         doc_id = hashlib.sha256(file_path.encode()).hexdigest()[:32]
         
         try:
-            # Query for chunks from this document
-            self.vector_store.collection.load()
+            # Query for chunks from this document, the store loaded the collection on init
             results = self.vector_store.collection.query(
                 expr=f'doc_id == "{doc_id}"',
                 output_fields=["chunk_id"],
@@ -174,7 +148,6 @@ class IndexingPipeline:
             Dictionary with summary statistics
         """
 
-        ingestion_pipeline = IngestionPipeline()
         results = []
         supported_exts = {'.pdf', '.txt', '.docx', '.md'}
         
@@ -195,6 +168,7 @@ class IndexingPipeline:
         
         print(f"Found {len(all_files)} supported documents\n")
         
+        pending = []
         for idx, file_path in enumerate(all_files, 1):
             filename = os.path.basename(file_path)
 
@@ -207,24 +181,48 @@ class IndexingPipeline:
                 })
                 continue
 
-            print(f"[{idx}/{len(all_files)}] Processing: {filename}")
+            pending.append((idx, file_path))
 
-            try:
-                # Ingest (load + process)
-                doc_data = ingestion_pipeline.ingest_document(file_path)
-                
-                # Index (chunk + embed + store)
-                result = self.index_document(doc_data, store_in_milvus)
-                results.append(result)
-                
-            except Exception as e:
-                print(f"Error indexing {filename}: {str(e)}")
-                results.append({
-                    "file_path": file_path,
-                    "doc_name": filename,
-                    "error": str(e),
-                    "status": "failed"
-                })
+        # Ingest (load + process) is CPU bound, so it runs in worker processes. Indexing
+        # stays in this process since it owns the embedding and Milvus clients. Ingest
+        # outruns the network bound embed step, so only a couple of files per worker are
+        # in flight, otherwise finished documents would pile up here for the whole directory
+        max_in_flight = 2 * (os.cpu_count() or 1)
+        queued = iter(pending)
+        in_flight = {}
+
+        while True:
+            for idx, file_path in itertools.islice(queued, max_in_flight - len(in_flight)):
+                self._submit_ingest(in_flight, idx, file_path)
+            if not in_flight:
+                break
+
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                idx, file_path, pool = in_flight.pop(future)
+                filename = os.path.basename(file_path)
+
+                print(f"[{idx}/{len(all_files)}] Processing: {filename}")
+
+                try:
+                    doc_data = future.result()
+                    
+                    # Index (chunk + embed + store)
+                    result = self.index_document(doc_data, store_in_milvus)
+                    results.append(result)
+                    
+                except Exception as e:
+                    if isinstance(e, BrokenProcessPool):
+                        # a worker died (e.g. out of memory on a huge file), which fails every
+                        # file in flight and leaves the pool unusable for later calls
+                        self._replace_broken_pool(pool)
+                    print(f"Error indexing {filename}: {str(e)}")
+                    results.append({
+                        "file_path": file_path,
+                        "doc_name": filename,
+                        "error": str(e),
+                        "status": "failed"
+                    })
         
         successful = [r for r in results if r.get("status") == "success"]
         failed = [r for r in results if r.get("status") == "failed"]
@@ -259,3 +257,29 @@ class IndexingPipeline:
     def get_stats(self) -> dict:
         """Get statistics about the vector store"""
         return self.vector_store.get_collection_stats()
+    
+    def _submit_ingest(self, in_flight: dict, idx: int, file_path: str) -> None:
+        """Send a file to the ingest pool, starting a fresh pool if the current one broke"""
+        pool = self._ingest_pool
+        try:
+            future = pool.submit(ingest_file, file_path)
+        except BrokenProcessPool:
+            self._replace_broken_pool(pool)
+            pool = self._ingest_pool
+            future = pool.submit(ingest_file, file_path)
+        in_flight[future] = (idx, file_path, pool)
+    
+    def _replace_broken_pool(self, broken: ProcessPoolExecutor) -> None:
+        """Swap in a fresh ingest pool, unless one was already started since the break"""
+        if self._ingest_pool is broken:
+            broken.shutdown(wait=False, cancel_futures=True)
+            self._ingest_pool = ProcessPoolExecutor(max_workers=os.cpu_count())
+    
+    def close(self) -> None:
+        """Shut down the ingest worker pool"""
+        self._ingest_pool.shutdown()
+    
+    def __del__(self):
+        pool = getattr(self, "_ingest_pool", None)
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
@@ -1,5 +1,8 @@
+import functools
+import itertools
 import os
-from typing import Any, Optional, Literal
+from typing import Any, Optional, Literal, Sequence
+import numpy as np
 from pymilvus import (
     connections,
     Collection,
@@ -8,11 +11,29 @@ from pymilvus import (
     DataType,
     utility
 )
-from dotenv import load_dotenv
-load_dotenv()
+from pymilvus.client.types import LoadState
+from app.config import load_env
 
 DocType = Literal["documentation", "rfc", "research", "manual"]
 
+
+@functools.cache
+def _ensure_connection(host: str, port: int) -> None:
+    # one connection per address for the whole process, later stores reuse it
+    connections.connect(
+        alias="default",
+        host=host,
+        port=port,
+        timeout=10
+    )
+
+
+def _quote_expr_value(value: str) -> str:
+    """Quote a value as a Milvus expression string literal"""
+    escaped = value.replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{escaped}"'
+
+
 class MilvusVectorStore:
     """Milvus vector database client for RAG system"""
     
@@ -23,6 +44,16 @@ class MilvusVectorStore:
         "manual": "Software manuals and guides"
     }
 
+    SEARCH_OUTPUT_FIELDS = ["chunk_id", "doc_id", "doc_name", "doc_type", "source", "content", "chunk_index"]
+
+    INDEX_PARAMS = {
+        "metric_type": "COSINE",
+        "index_type": "HNSW",
+        "params": {"M": 16, "efConstruction": 200}
+    }
+    HNSW_EF = 64
+    IVF_NPROBE = 10
+
     def __init__(
         self,
         collection_name: str = "technical_documents",
@@ -39,22 +70,22 @@ class MilvusVectorStore:
             port: Milvus server port
             embedding_dim: Dimension of embedding vectors
         """
+        load_env()
         self.collection_name = collection_name
         self.host = host or os.getenv("MILVUS_HOST", "localhost")
         self.port = port
         self.embedding_dim = embedding_dim
         self.collection = None
+        self._index_type = None
+        # filters for the known doc types never change, build them once
+        self._doctype_filter = {t: f'doc_type == "{t}"' for t in self.DOC_TYPES}
+        self._valid_doc_types = frozenset(self.DOC_TYPES)
         self._connect()
         self._init_collection()
     
     def _connect(self):
         try:
-            connections.connect(
-                alias="default",
-                host=self.host,
-                port=self.port,
-                timeout=10
-            )
+            _ensure_connection(self.host, self.port)
             print(f"Connected to Milvus at {self.host}:{self.port}")
         except Exception as e:
             raise ConnectionError(f"Failed to connect to Milvus: {str(e)}")
@@ -132,7 +163,9 @@ class MilvusVectorStore:
             self.collection = Collection(self.collection_name)
 
             try:
-                self.collection.load()
+                # loading an already loaded collection is a wasted round trip
+                if utility.load_state(self.collection_name) != LoadState.Loaded:
+                    self.collection.load()
                 self.collection.flush()
                 print(f"Collection loaded with {self.collection.num_entities} entities")
             except Exception as e:
@@ -150,28 +183,62 @@ class MilvusVectorStore:
             self._create_index()    
             self.collection.load()
         
+        self._index_type = self._get_index_type()
         print(f"Collection ready: {self.collection.num_entities} chunks available")
     
     def _create_index(self):
-        """Create IVF_FLAT index for vector similarity search"""
-        index_params = {
-            "metric_type": "COSINE",  # L2 distance (can also use IP or cosine sim)
-            "index_type": "IVF_FLAT",
-            "params": {"nlist": 1024}
-        }
-        
+        """Create HNSW index for vector similarity search"""
         self.collection.create_index(
             field_name="embedding",
-            index_params=index_params
+            index_params=self.INDEX_PARAMS
         )
         print("Created vector index")
     
-    def insert_chunks(self, chunks: list[dict[str, Any]]) -> list[str]:
+    def _get_index_type(self) -> Optional[str]:
+        """Index type on the embedding field, collections created before HNSW keep IVF_FLAT until rebuild_index"""
+        for index in self.collection.indexes:
+            if index.field_name == "embedding":
+                return index.params.get("index_type")
+        return None
+    
+    def _search_params(self, top_k: int) -> dict[str, Any]:
+        """Search params matching the index the collection actually has"""
+        if self._index_type == "HNSW":
+            # HNSW rejects an ef smaller than the number of results asked for
+            params = {"ef": max(self.HNSW_EF, top_k)}
+        else:
+            params = {"nprobe": self.IVF_NPROBE}
+        return {"metric_type": "COSINE", "params": params}
+    
+    def rebuild_index(self) -> None:
+        """
+        Replace the vector index with the current INDEX_PARAMS (data is preserved).
+        Migrates collections created with IVF_FLAT to HNSW, searches can't run
+        while the index is rebuilt
+        """
+        try:
+            self.collection.release()
+            self.collection.drop_index()
+            self._create_index()
+            self.collection.load()
+        except Exception as e:
+            raise RuntimeError(f"Failed to rebuild index: {str(e)}")
+        finally:
+            # a failure can leave the collection with no index or the old one
+            self._index_type = self._get_index_type()
+        print(f"Index rebuilt for collection: {self.collection_name}")
+    
+    def insert_chunks(
+        self,
+        chunks: list[dict[str, Any]],
+        batch_size: int = 256
+    ) -> list[str]:
         """
         Insert document chunks with embeddings into Milvus
         
         Args:
             chunks: List of chunk dictionaries with required fields
+            batch_size: Number of chunks sent per insert request
             
         Returns:
             List of inserted chunk IDs
@@ -179,50 +246,61 @@ class MilvusVectorStore:
         if not chunks:
             return []
         
-        if chunks and "metadata" in chunks[0]:
-            doc_type = chunks[0]["metadata"].get("doc_type")
-            if doc_type and doc_type not in self.DOC_TYPES:
+        # check every chunk up front, a bad one in a later batch must not leave the
+        # earlier batches inserted
+        for chunk in chunks:
+            doc_type = chunk["metadata"].get("doc_type")
+            if doc_type not in self._valid_doc_types:
                 raise ValueError(f"Invalid document type: {doc_type}. Must be one of {list(self.DOC_TYPES.keys())}")
 
         chunk_ids = []
-        doc_ids = []
-        doc_names = []
-        doc_types = []
-        sources = []
-        contents = []
-        chunk_indices = []
-        embeddings = []
-        
-        for chunk in chunks:
-            chunk_ids.append(chunk["chunk_id"])
-            doc_ids.append(chunk["doc_id"])
-            doc_names.append(chunk["metadata"]["doc_name"])
-            doc_types.append(chunk["metadata"]["doc_type"])
-            sources.append(chunk["metadata"]["source"])
-            contents.append(chunk["content"])
-            chunk_indices.append(chunk["metadata"]["chunk_index"])
-            embeddings.append(chunk["embedding"])
-        
-        data = [
-            chunk_ids,
-            doc_ids,
-            doc_names,
-            doc_types,
-            sources,
-            contents,
-            chunk_indices,
-            embeddings
-        ]
         
         try:
-            insert_result = self.collection.insert(data)
+            # insert in batches so only one batch worth of request payload is built at a time,
+            # and flush once at the end instead of per insert
+            for batch in itertools.batched(chunks, batch_size):
+                self.collection.insert(self._build_insert_data(batch))
+                chunk_ids.extend(chunk["chunk_id"] for chunk in batch)
+            
             self.collection.flush()
             print(f"Inserted {len(chunk_ids)} chunks into Milvus")
             return chunk_ids
         
         except Exception as e:
+            # a half indexed document would pass is_document_indexed and never get
+            # retried, so take the batches that did make it back out
+            self._delete_chunk_ids(chunk_ids, batch_size)
             raise RuntimeError(f"Failed to insert chunks: {str(e)}")
     
+    def _delete_chunk_ids(self, chunk_ids: list[str], batch_size: int) -> None:
+        """Best effort delete of inserted chunks, the insert error is the one worth raising"""
+        if not chunk_ids:
+            return
+        try:
+            for batch in itertools.batched(chunk_ids, batch_size):
+                ids = ", ".join(_quote_expr_value(chunk_id) for chunk_id in batch)
+                self.collection.delete(f"chunk_id in [{ids}]")
+            self.collection.flush()
+            print(f"Rolled back {len(chunk_ids)} chunks after a failed insert")
+        except Exception as e:
+            print(f"Failed to roll back inserted chunks: {str(e)}")
+    
+    def _build_insert_data(self, chunks: Sequence[dict[str, Any]]) -> list[list]:
+        """Build the column-ordered insert payload for a batch of chunks"""
+        # build each column in its own pass, with the metadata lookup done once per chunk
+        metadatas = [chunk["metadata"] for chunk in chunks]
+        
+        return [
+            [chunk["chunk_id"] for chunk in chunks],
+            [chunk["doc_id"] for chunk in chunks],
+            [meta["doc_name"] for meta in metadatas],
+            [meta["doc_type"] for meta in metadatas],
+            [meta["source"] for meta in metadatas],
+            [chunk["content"] for chunk in chunks],
+            [meta["chunk_index"] for meta in metadatas],
+            [chunk["embedding"] for chunk in chunks]
+        ]
+    
     def search(
         self,
         query_embedding: list[float],
@@ -244,47 +322,74 @@ class MilvusVectorStore:
         Returns:
             List of search results with metadata
         """
-        search_params = {
-            "metric_type": "COSINE",
-            "params": {"nprobe": 10}
-        }
+        return self.search_batch(
+            [query_embedding],
+            top_k=top_k,
+            doc_type=doc_type,
+            source=source,
+            filter_expr=filter_expr
+        )[0]
+    
+    def search_batch(
+        self,
+        query_embeddings: Sequence[list[float]] | np.ndarray,
+        top_k: int = 5,
+        doc_type: Optional[str] = None,
+        source: Optional[str] = None,
+        filter_expr: Optional[str] = None
+    ) -> list[list[dict[str, Any]]]:
+        """
+        Search for several query vectors in a single request
+        
+        Args:
+            query_embeddings: Query vectors, as a list of lists or a 2D array
+            top_k: Number of results to return per query
+            doc_type: Filter by document type(documentation/rfc/research paper/manual)
+            source: Filter by specific source(eg "docker", "fastapi" etc.)
+            filter_expr: Custom filter expression (overrides doc_type and source)
+            
+        Returns:
+            One list of search results per query vector, in query order
+        """
+        if len(query_embeddings) == 0:
+            return []
+        
+        if isinstance(query_embeddings, np.ndarray):
+            query_embeddings = query_embeddings.tolist()
         
         if filter_expr is None and (doc_type or source):
             filters = []
             if doc_type:
                 if doc_type not in self.DOC_TYPES:
                     raise ValueError(f"Invalid doc_type. Must be one of: {list(self.DOC_TYPES.keys())}")
-                filters.append(f'doc_type == "{doc_type}')
+                filters.append(self._doctype_filter[doc_type])
             if source:
-                filters.append(f'source == "{source}"')
+                # source comes from the caller, quote it so it can't break out of the literal
+                filters.append(f'source == {_quote_expr_value(source)}')
             filter_expr = " && ".join(filters) if filters else None
 
         try:
             results = self.collection.search(
-                data=[query_embedding],
+                data=list(query_embeddings),
                 anns_field="embedding",
-                param=search_params,
+                param=self._search_params(top_k),
                 limit=top_k,
                 expr=filter_expr,
-                output_fields=["chunk_id", "doc_id", "doc_name", "doc_type", "source", "content", "chunk_index"]
+                output_fields=self.SEARCH_OUTPUT_FIELDS
             )
             
-            formatted_results = []
-            for hits in results:
-                for hit in hits:
-                    formatted_results.append({
-                        "chunk_id": hit.entity.get("chunk_id"),
-                        "doc_id": hit.entity.get("doc_id"),
-                        "doc_name": hit.entity.get("doc_name"),
-                        "doc_type": hit.entity.get("doc_type"),
-                        "source": hit.entity.get("source"),
-                        "content": hit.entity.get("content"),
-                        "chunk_index": hit.entity.get("chunk_index"),
+            # hit.fields already holds every output field, copy it in one go
+            return [
+                [
+                    {
+                        **hit.fields,
                         "distance": hit.distance,
                         "score": 1 / (1 + hit.distance)  # Convert distance to similarity score
-                    })
-            
-            return formatted_results
+                    }
+                    for hit in hits
+                ]
+                for hits in results
+            ]
         
         except Exception as e:
             raise RuntimeError(f"Search failed: {str(e)}")
@@ -316,7 +421,7 @@ class MilvusVectorStore:
             Number of deleted chunks
         """
         try:
-            expr = f'doc_id == "{doc_id}"'
+            expr = f'doc_id == {_quote_expr_value(doc_id)}'
             result = self.collection.delete(expr)
             self.collection.flush()
             print(f"Deleted chunks for doc_id: {doc_id}")
@@ -330,7 +435,7 @@ class MilvusVectorStore:
         Delete all chunks belonging to a source
         """
         try:
-            expr = f'source == "{source}"'
+            expr = f'source == {_quote_expr_value(source)}'
             result = self.collection.delete(expr)
             self.collection.flush()
             print(f"Deleted chunks for source: {source}")
@@ -363,14 +468,14 @@ class MilvusVectorStore:
             "doc_types": {}
         }
         
+        # count server side, fetching ids capped the count at the query limit
         for doc_type in self.DOC_TYPES.keys():
             try:
                 results = self.collection.query(
-                    expr=f'doc_type == "{doc_type}"',
-                    output_fields=["chunk_id"],
-                    limit=16384
+                    expr=self._doctype_filter[doc_type],
+                    output_fields=["count(*)"]
                 )
-                stats["doc_types"][doc_type] = len(results)
+                stats["doc_types"][doc_type] = results[0]["count(*)"]
             except Exception as e:
                 stats["doc_types"][doc_type] = "N/A"
         
@@ -384,20 +489,32 @@ class MilvusVectorStore:
             doc_type: Optional filter by document type
         """
 
-        expr = f'doc_type == "{doc_type}"' if doc_type else None
+        expr = None
+        if doc_type:
+            if doc_type not in self.DOC_TYPES:
+                raise ValueError(f"Invalid doc_type. Must be one of: {list(self.DOC_TYPES.keys())}")
+            expr = self._doctype_filter[doc_type]
 
         try:
-            results = self.collection.query(
+            # page through every match instead of a single capped query, keeping only
+            # the unique sources in memory
+            sources = set()
+            iterator = self.collection.query_iterator(
+                batch_size=1000,
                 expr=expr,
-                output_fields=["source"],
-                limit=16384
+                output_fields=["source"]
             )
-            sources = list(set([r["source"] for r in results]))
+            try:
+                while batch := iterator.next():
+                    sources.update(r["source"] for r in batch)
+            finally:
+                iterator.close()
             return sorted(sources)
         except Exception as e:
             raise RuntimeError(f"Failed to list sources: {str(e)}")
 
     def check_collection(collection_name: str="technical_docs", port: int=19530) -> None:
+        load_env()
         connections.connect(
             host=os.getenv("MILVUS_HOST"),
             port=port
@@ -434,8 +551,10 @@ class MilvusVectorStore:
                     print(f"  - {r}")
 
         connections.disconnect("default")
+        _ensure_connection.cache_clear()
 
     def disconnect(self):
         """Disconnect from Milvus"""
         connections.disconnect("default")
+        _ensure_connection.cache_clear()
         print("Disconnected from Milvus")
\ No newline at end of file
@@ -3,8 +3,11 @@ from app.ingestion.pipeline import IngestionPipeline, IndexingPipeline
 def main():
 
     indexing_pipeline = IndexingPipeline()
-    summary = indexing_pipeline.index_directory("./data/raw/documentations/kubernetes", skip_existing=True, store_in_milvus=True)
-    print(summary)
+    try:
+        summary = indexing_pipeline.index_directory("./data/raw/documentations/kubernetes", skip_existing=True, store_in_milvus=True)
+        print(summary)
+    finally:
+        indexing_pipeline.close()
 
 if __name__ == "__main__":
     main()